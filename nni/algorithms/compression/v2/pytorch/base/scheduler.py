@@ -10,7 +10,7 @@ from typing import List, Dict, Tuple, Literal, Optional
 import json_tricks
 import torch
 from torch.nn import Module
-from torch.tensor import Tensor
+from torch import Tensor
 
 _logger = logging.getLogger(__name__)
 
@@ -19,7 +19,8 @@ class Task:
     # NOTE: If we want to support multi-thread, this part need to refactor, maybe use file and lock to sync.
     _reference_counter = {}
 
-    def __init__(self, task_id: int, model_path: str, masks_path: str, config_list_path: str) -> None:
+    def __init__(self, task_id: int, model_path: Optional[str], masks_path: Optional[str], config_list_path: str,
+                 model: Optional[Module] = None, masks: Optional[Dict[str, Dict[str, Tensor]]] = None) -> None:
         """
         Parameters
         ----------
@@ -27,16 +28,25 @@ class Task:
             The unique id of task.
         model_path
             The path of the unwrapped pytorch model that will be pruned in this task.
+            Can be None if `model` is provided.
         masks_path
             The path of the masks that applied on the model before pruning.
+            Can be None if `masks` is provided.
         config_list_path
             The path of the config list that used in this task.
+        model
+            The in-memory unwrapped pytorch model that will be pruned in this task. If set, it is used instead of `model_path`.
+        masks
+            The in-memory masks that applied on the model before pruning. If set, it is used instead of `masks_path`.
         """
         self.task_id = task_id
         self.model_path = model_path
         self.masks_path = masks_path
         self.config_list_path = config_list_path
 
+        self._model = model
+        self._masks = masks
+
         self.status: Literal['Pending', 'Running', 'Finished'] = 'Pending'
         self.score: Optional[float] = None
 
@@ -51,8 +61,8 @@ class Task:
     def to_dict(self) -> Dict:
         return {
             'task_id': self.task_id,
-            'model_path': str(self.model_path),
-            'masks_path': str(self.masks_path),
+            'model_path': str(self.model_path) if self.model_path is not None else None,
+            'masks_path': str(self.masks_path) if self.masks_path is not None else None,
             'config_list_path': str(self.config_list_path),
             'status': self.status,
             'score': self.score,
@@ -67,8 +77,8 @@ class Task:
             Return the model pruning in this task, the masks of the model before pruning,
             the config list used in this task.
         """
-        model = torch.load(self.model_path)
-        masks = torch.load(self.masks_path)
+        model = self._model if self._model is not None else torch.load(self.model_path)
+        masks = self._masks if self._masks is not None else torch.load(self.masks_path)
         with Path(self.config_list_path).open('r') as f:
             config_list = json_tricks.load(f)
         return model, masks, config_list
@@ -77,7 +87,7 @@ class Task:
         """
         Return the path list that need to count reference in this task.
         """
-        return [self.model_path, self.masks_path, self.config_list_path]
+        return [path for path in (self.model_path, self.masks_path, self.config_list_path) if path is not None]
 
     def clean_up(self):
         """
@@ -91,6 +101,7 @@ class Task:
                     if self._reference_counter[ref] < 0:
                         _logger.warning('Referance counter error, the number of %s is %d',
                                         ref, self._reference_counter[ref])
+            self._model, self._masks = None, None
             self._cleaned = True
         else:
             _logger.warning('Already clean up task %d', self.task_id)
@@ -482,6 +482,10 @@ class TaskGenerator:
         self._origin_config_list_path = Path(self._log_dir_root, 'origin', 'config_list.json')
         self._save_data('origin', origin_model, origin_masks, origin_config_list)
 
+        # the origin model and masks never change, load them lazily at most once
+        self._origin_model_cache: Optional[Module] = None
+        self._origin_masks_cache: Optional[Dict[str, Dict[str, Tensor]]] = None
+
         self._task_id_candidate = 0
         self._tasks: Dict[int, Task] = {}
         self._pending_tasks: List[Task] = self.init_pending_tasks()
@@ -504,6 +508,16 @@ class TaskGenerator:
         with Path(self._log_dir_root, folder_name, 'config_list.json').open('w') as f:
             json_tricks.dump(config_list, f, indent=4)
 
+    def _get_origin_model(self) -> Module:
+        if self._origin_model_cache is None:
+            self._origin_model_cache = torch.load(self._origin_model_path)
+        return self._origin_model_cache
+
+    def _get_origin_masks(self) -> Dict[str, Dict[str, Tensor]]:
+        if self._origin_masks_cache is None:
+            self._origin_masks_cache = torch.load(self._origin_masks_path)
+        return self._origin_masks_cache
+
     def update_best_result(self, task_result: TaskResult):
         score = task_result.score
         if score is not None:
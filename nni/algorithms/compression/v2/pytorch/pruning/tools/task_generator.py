@@ -2,10 +2,14 @@
 # Licensed under the MIT license.
 
 from copy import deepcopy
+import io
+import json
 import logging
+import os
 from pathlib import Path
-from typing import Dict, List, Tuple
-import json_tricks
+import pickle
+import shutil
+from typing import Any, Dict, List, Tuple, Union
 
 import numpy as np
 from torch import Tensor
@@ -22,6 +26,38 @@ from .base import TaskGenerator
 
 _logger = logging.getLogger(__name__)
 
+# the number of candidates sampled at once in the rejection sampling of simulated annealing
+_SAMPLE_BATCH_SIZE = 8
+
+
+def _save(obj: Any, path: Union[str, Path]):
+    """
+    Serialize `obj` into memory first, then write it to `path` in one large write.
+    Calling `torch.save` directly on a file issues lots of small writes.
+    """
+    buffer = io.BytesIO()
+    torch.save(obj, buffer, pickle_protocol=pickle.HIGHEST_PROTOCOL)
+    with open(path, 'wb', buffering=1 << 20) as f:
+        f.write(buffer.getbuffer())
+
+
+def _link_or_copy(src: Union[str, Path], dst: Union[str, Path]):
+    """
+    Hard-link `src` to `dst`, fall back to copy if hard link is not supported.
+    """
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def _total_sparsity_array(config_list: List[Dict]) -> np.ndarray:
+    return np.fromiter((config['total_sparsity'] for config in config_list), dtype=float, count=len(config_list))
+
+
+def _clone_sparsity_list(sparsity_list: List) -> List:
+    return [sparsity.copy() if isinstance(sparsity, np.ndarray) else list(sparsity) for sparsity in sparsity_list]
+
 
 class FunctionBasedTaskGenerator(TaskGenerator):
     def __init__(self, total_iteration: int, origin_model: Module, origin_config_list: List[Dict],
@@ -51,8 +87,13 @@ class FunctionBasedTaskGenerator(TaskGenerator):
                          log_dir=log_dir, keep_intermidiate_result=keep_intermidiate_result)
 
     def init_pending_tasks(self) -> List[Task]:
-        origin_model = torch.load(self._origin_model_path)
-        origin_masks = torch.load(self._origin_masks_path)
+        origin_model = self._get_origin_model()
+        origin_masks = self._get_origin_masks()
+        # the compact model of the origin task will be pruned in place by the next task if it is kept in memory,
+        # so copy it to protect the cached origin model and masks, it is saved to disk untouched otherwise.
+        if not self._keep_intermidiate_result:
+            origin_model = deepcopy(origin_model)
+            origin_masks = deepcopy(origin_masks)
 
         task_result = TaskResult('origin', origin_model, origin_masks, origin_masks, None)
 
@@ -62,16 +103,20 @@ class FunctionBasedTaskGenerator(TaskGenerator):
         compact_model = task_result.compact_model
         compact_model_masks = task_result.compact_model_masks
 
-        # save intermidiate result
-        model_path = Path(self._intermidiate_result_dir, '{}_compact_model.pth'.format(task_result.task_id))
-        masks_path = Path(self._intermidiate_result_dir, '{}_compact_model_masks.pth'.format(task_result.task_id))
-        torch.save(compact_model, model_path)
-        torch.save(compact_model_masks, masks_path)
+        # save intermidiate result only if keeping it, otherwise hand over the in-memory model and masks to the next task
+        if self._keep_intermidiate_result:
+            model_path = self._intermidiate_result_dir / f'{task_result.task_id}_compact_model.pth'
+            masks_path = self._intermidiate_result_dir / f'{task_result.task_id}_compact_model_masks.pth'
+            _save(compact_model, model_path)
+            _save(compact_model_masks, masks_path)
+        else:
+            model_path, masks_path = None, None
 
         # get current2origin_sparsity and compact2origin_sparsity
-        origin_model = torch.load(self._origin_model_path)
+        origin_model = self._get_origin_model()
         current2origin_sparsity, compact2origin_sparsity, _ = compute_sparsity(origin_model, compact_model, compact_model_masks, self.target_sparsity)
-        _logger.info('\nTask %s total real sparsity compared with original model is:\n%s', str(task_result.task_id), json_tricks.dumps(current2origin_sparsity, indent=4))
+        if _logger.isEnabledFor(logging.INFO):
+            _logger.info('\nTask %s total real sparsity compared with original model is:\n%s', str(task_result.task_id), json.dumps(current2origin_sparsity, indent=4))
         if task_result.task_id != 'origin':
             self._tasks[task_result.task_id].state['current2origin_sparsity'] = current2origin_sparsity
 
@@ -81,11 +126,13 @@ class FunctionBasedTaskGenerator(TaskGenerator):
 
         task_id = self._task_id_candidate
         new_config_list = self.generate_config_list(self.target_sparsity, self.current_iteration, compact2origin_sparsity)
-        config_list_path = Path(self._intermidiate_result_dir, '{}_config_list.json'.format(task_id))
+        config_list_path = self._intermidiate_result_dir / f'{task_id}_config_list.json'
 
-        with Path(config_list_path).open('w') as f:
-            json_tricks.dump(new_config_list, f, indent=4)
-        task = Task(task_id, model_path, masks_path, config_list_path)
+        with config_list_path.open('w') as f:
+            json.dump(new_config_list, f, indent=4)
+        task = Task(task_id, model_path, masks_path, config_list_path,
+                    model=None if self._keep_intermidiate_result else compact_model,
+                    masks=None if self._keep_intermidiate_result else compact_model_masks)
 
         self._tasks[task_id] = task
 
@@ -97,29 +144,27 @@ class FunctionBasedTaskGenerator(TaskGenerator):
     def generate_config_list(self, target_sparsity: List[Dict], iteration: int, compact2origin_sparsity: List[Dict]) -> List[Dict]:
         raise NotImplementedError()
 
+    def _ori_sparsity_to_config_list(self, target_sparsity: List[Dict], ori_sparsity: np.ndarray,
+                                     compact2origin_sparsity: List[Dict]) -> List[Dict]:
+        """
+        Convert the expected sparsity (compared with the origin model) of each config to the sparsity on the compact model.
+        """
+        model_sparsity = _total_sparsity_array(compact2origin_sparsity)
+        sparsity = np.maximum(0.0, (ori_sparsity - model_sparsity) / (1 - model_sparsity))
+        assert np.all((0 <= sparsity) & (sparsity <= 1)), 'sparsity: {}, ori_sparsity: {}, model_sparsity: {}'.format(sparsity, ori_sparsity, model_sparsity)
+        return [{**target, 'total_sparsity': float(s)} for target, s in zip(target_sparsity, sparsity)]
+
 
 class AGPTaskGenerator(FunctionBasedTaskGenerator):
     def generate_config_list(self, target_sparsity: List[Dict], iteration: int, compact2origin_sparsity: List[Dict]) -> List[Dict]:
-        config_list = []
-        for target, mo in zip(target_sparsity, compact2origin_sparsity):
-            ori_sparsity = (1 - (1 - iteration / self.total_iteration) ** 3) * target['total_sparsity']
-            sparsity = max(0.0, (ori_sparsity - mo['total_sparsity']) / (1 - mo['total_sparsity']))
-            assert 0 <= sparsity <= 1, 'sparsity: {}, ori_sparsity: {}, model_sparsity: {}'.format(sparsity, ori_sparsity, mo['total_sparsity'])
-            config_list.append(deepcopy(target))
-            config_list[-1]['total_sparsity'] = sparsity
-        return config_list
+        ori_sparsity = (1 - (1 - iteration / self.total_iteration) ** 3) * _total_sparsity_array(target_sparsity)
+        return self._ori_sparsity_to_config_list(target_sparsity, ori_sparsity, compact2origin_sparsity)
 
 
 class LinearTaskGenerator(FunctionBasedTaskGenerator):
     def generate_config_list(self, target_sparsity: List[Dict], iteration: int, compact2origin_sparsity: List[Dict]) -> List[Dict]:
-        config_list = []
-        for target, mo in zip(target_sparsity, compact2origin_sparsity):
-            ori_sparsity = iteration / self.total_iteration * target['total_sparsity']
-            sparsity = max(0.0, (ori_sparsity - mo['total_sparsity']) / (1 - mo['total_sparsity']))
-            assert 0 <= sparsity <= 1, 'sparsity: {}, ori_sparsity: {}, model_sparsity: {}'.format(sparsity, ori_sparsity, mo['total_sparsity'])
-            config_list.append(deepcopy(target))
-            config_list[-1]['total_sparsity'] = sparsity
-        return config_list
+        ori_sparsity = iteration / self.total_iteration * _total_sparsity_array(target_sparsity)
+        return self._ori_sparsity_to_config_list(target_sparsity, ori_sparsity, compact2origin_sparsity)
 
 
 class LotteryTicketTaskGenerator(FunctionBasedTaskGenerator):
@@ -130,18 +175,12 @@ class LotteryTicketTaskGenerator(FunctionBasedTaskGenerator):
         self.current_iteration = 1
 
     def generate_config_list(self, target_sparsity: List[Dict], iteration: int, compact2origin_sparsity: List[Dict]) -> List[Dict]:
-        config_list = []
-        for target, mo in zip(target_sparsity, compact2origin_sparsity):
-            # NOTE: The ori_sparsity calculation formula in compression v1 is as follow, it is different from the paper.
-            # But the formula in paper will cause numerical problems, so keep the formula in compression v1.
-            ori_sparsity = 1 - (1 - target['total_sparsity']) ** (iteration / self.total_iteration)
-            # The following is the formula in paper.
-            # ori_sparsity = (target['total_sparsity'] * 100) ** (iteration / self.total_iteration) / 100
-            sparsity = max(0.0, (ori_sparsity - mo['total_sparsity']) / (1 - mo['total_sparsity']))
-            assert 0 <= sparsity <= 1, 'sparsity: {}, ori_sparsity: {}, model_sparsity: {}'.format(sparsity, ori_sparsity, mo['total_sparsity'])
-            config_list.append(deepcopy(target))
-            config_list[-1]['total_sparsity'] = sparsity
-        return config_list
+        # NOTE: The ori_sparsity calculation formula in compression v1 is as follow, it is different from the paper.
+        # But the formula in paper will cause numerical problems, so keep the formula in compression v1.
+        ori_sparsity = 1 - (1 - _total_sparsity_array(target_sparsity)) ** (iteration / self.total_iteration)
+        # The following is the formula in paper.
+        # ori_sparsity = (target_sparsity * 100) ** (iteration / self.total_iteration) / 100
+        return self._ori_sparsity_to_config_list(target_sparsity, ori_sparsity, compact2origin_sparsity)
 
 
 class SimulatedAnnealingTaskGenerator(TaskGenerator):
@@ -181,6 +220,17 @@ class SimulatedAnnealingTaskGenerator(TaskGenerator):
         self.target_sparsity_list = config_list_canonical(origin_model, origin_config_list)
         self._adjust_target_sparsity()
 
+        # the op names in each config sorted by weight numel and their weight numel, both are fixed during annealing,
+        # indexed in the same order as `target_sparsity_list`
+        sorted_weights_numel = sorted(self.weights_numel.items(), key=lambda item: item[1])
+        self._sorted_op_names = [[k for k, _ in sorted_weights_numel if k in config['op_names']]
+                                 for config in self.target_sparsity_list]
+        self._sorted_weights_numel = [np.array([self.weights_numel[k] for k in op_names], dtype=np.int64)
+                                      for op_names in self._sorted_op_names]
+
+        # seed from the global numpy random state so that `np.random.seed` still makes the annealing reproducible
+        self._rng = np.random.default_rng(np.random.randint(2**32, dtype=np.int64))
+
         self._temp_config_list = None
         self._current_sparsity_list = None
         self._current_score = None
@@ -195,23 +245,24 @@ class SimulatedAnnealingTaskGenerator(TaskGenerator):
         if len(self.masked_rate) > 0:
             for config in self.target_sparsity_list:
                 sparsity, op_names = config['total_sparsity'], config['op_names']
-                remaining_weight_numel = 0
-                pruned_weight_numel = 0
-                for name in op_names:
-                    remaining_weight_numel += self.weights_numel[name]
-                    if name in self.masked_rate:
-                        pruned_weight_numel += 1 / (1 / self.masked_rate[name] - 1) * self.weights_numel[name]
-                config['total_sparsity'] = max(0, sparsity - pruned_weight_numel / (pruned_weight_numel + remaining_weight_numel))
+                weights_numel = np.array([self.weights_numel[name] for name in op_names], dtype=np.float64)
+                masked_rate = np.array([self.masked_rate.get(name, 0.) for name in op_names], dtype=np.float64)
+                # pruned numel = masked_rate / (1 - masked_rate) * remaining numel, fully masked ops have no remaining numel.
+                pruned_rate = np.divide(masked_rate, 1 - masked_rate, out=np.zeros_like(masked_rate), where=masked_rate < 1)
+                remaining_weight_numel = weights_numel.sum()
+                pruned_weight_numel = (pruned_rate * weights_numel).sum()
+                config['total_sparsity'] = max(0., float(sparsity - pruned_weight_numel / (pruned_weight_numel + remaining_weight_numel)))
 
     def _init_temp_config_list(self):
         self._temp_config_list = []
         self._temp_sparsity_list = []
-        for config in self.target_sparsity_list:
-            sparsity_config, sparsity = self._init_config_sparsity(config)
+        for idx in range(len(self.target_sparsity_list)):
+            sparsity_config, sparsity = self._init_config_sparsity(idx)
             self._temp_config_list.extend(sparsity_config)
             self._temp_sparsity_list.append(sparsity)
 
-    def _init_config_sparsity(self, config: Dict) -> Tuple[List[Dict], List]:
+    def _init_config_sparsity(self, idx: int) -> Tuple[List[Dict], List]:
+        config = self.target_sparsity_list[idx]
         assert 'total_sparsity' in config, 'Sparsity must be set in config: {}'.format(config)
         target_sparsity = config['total_sparsity']
         op_names = config['op_names']
@@ -220,38 +271,38 @@ class SimulatedAnnealingTaskGenerator(TaskGenerator):
             return [], []
 
         while True:
-            random_sparsity = sorted(np.random.uniform(0, 1, len(op_names)))
-            rescaled_sparsity = self._rescale_sparsity(random_sparsity, target_sparsity, op_names)
-            if rescaled_sparsity is not None and rescaled_sparsity[0] >= 0 and rescaled_sparsity[-1] < 1:
-                break
+            # sample a batch of candidates at once and take the first valid one
+            for random_sparsity in np.sort(self._rng.uniform(0, 1, (_SAMPLE_BATCH_SIZE, len(op_names))), axis=1):
+                rescaled_sparsity = self._rescale_sparsity(random_sparsity, target_sparsity, idx)
+                if rescaled_sparsity is not None and rescaled_sparsity[0] >= 0 and rescaled_sparsity[-1] < 1:
+                    return self._sparsity_to_config_list(rescaled_sparsity, idx), rescaled_sparsity
 
-        return self._sparsity_to_config_list(rescaled_sparsity, config), rescaled_sparsity
-
-    def _rescale_sparsity(self, random_sparsity: List, target_sparsity: float, op_names: List) -> List:
-        assert len(random_sparsity) == len(op_names)
-
-        num_weights = sorted([self.weights_numel[op_name] for op_name in op_names])
-        sparsity = sorted(random_sparsity)
+    def _rescale_sparsity(self, random_sparsity: List, target_sparsity: float, idx: int) -> List:
+        """
+        Rescale the sorted `random_sparsity` to make the total sparsity of the ops in `target_sparsity_list[idx]`
+        equal to `target_sparsity`.
+        """
+        num_weights = self._sorted_weights_numel[idx]
+        assert len(random_sparsity) == len(num_weights)
 
-        total_weights = 0
-        total_weights_pruned = 0
+        sparsity = np.asarray(random_sparsity, dtype=np.float64)
 
         # calculate the scale
-        for idx, num_weight in enumerate(num_weights):
-            total_weights += num_weight
-            total_weights_pruned += int(num_weight * sparsity[idx])
+        total_weights = num_weights.sum()
+        total_weights_pruned = (num_weights * sparsity).astype(np.int64).sum()
         if total_weights_pruned == 0:
             return None
 
         scale = target_sparsity / (total_weights_pruned / total_weights)
 
         # rescale the sparsity
-        sparsity = np.asarray(sparsity) * scale
+        sparsity = sparsity * scale
         return sparsity
 
-    def _sparsity_to_config_list(self, sparsity: List, config: Dict) -> List[Dict]:
-        sparsity = sorted(sparsity)
-        op_names = [k for k, _ in sorted(self.weights_numel.items(), key=lambda item: item[1]) if k in config['op_names']]
+    def _sparsity_to_config_list(self, sparsity: List, idx: int) -> List[Dict]:
+        # the sparsity rescaled by `_rescale_sparsity` is already in ascending order
+        assert np.all(np.diff(sparsity) >= 0), 'sparsity should be sorted: {}'.format(sparsity)
+        op_names = self._sorted_op_names[idx]
         assert len(sparsity) == len(op_names)
         return [{'total_sparsity': sparsity, 'op_names': [op_name]} for sparsity, op_name in zip(sparsity, op_names)]
 
@@ -260,38 +311,46 @@ class SimulatedAnnealingTaskGenerator(TaskGenerator):
         self._temp_sparsity_list = []
         # decrease magnitude with current temperature
         magnitude = self.current_temperature / self.start_temperature * self.perturbation_magnitude
-        for config, current_sparsity in zip(self.target_sparsity_list, self._current_sparsity_list):
+        for idx, (config, current_sparsity) in enumerate(zip(self.target_sparsity_list, self._current_sparsity_list)):
             if len(current_sparsity) == 0:
                 self._temp_sparsity_list.append([])
                 continue
-            while True:
-                perturbation = np.random.uniform(-magnitude, magnitude, len(current_sparsity))
-                temp_sparsity = np.clip(0, current_sparsity + perturbation, None)
-                temp_sparsity = self._rescale_sparsity(temp_sparsity, config['total_sparsity'], config['op_names'])
-                if temp_sparsity is not None and temp_sparsity[0] >= 0 and temp_sparsity[-1] < 1:
-                    self._temp_config_list.extend(self._sparsity_to_config_list(temp_sparsity, config))
-                    self._temp_sparsity_list.append(temp_sparsity)
-                    break
+            temp_sparsity = None
+            while temp_sparsity is None:
+                # sample a batch of perturbations at once and take the first valid one
+                perturbations = self._rng.uniform(-magnitude, magnitude, (_SAMPLE_BATCH_SIZE, len(current_sparsity)))
+                for candidate in np.sort(np.clip(0, current_sparsity + perturbations, None), axis=1):
+                    candidate = self._rescale_sparsity(candidate, config['total_sparsity'], idx)
+                    if candidate is not None and candidate[0] >= 0 and candidate[-1] < 1:
+                        temp_sparsity = candidate
+                        break
+            self._temp_config_list.extend(self._sparsity_to_config_list(temp_sparsity, idx))
+            self._temp_sparsity_list.append(temp_sparsity)
 
     def _recover_real_sparsity(self, config_list: List[Dict]) -> List[Dict]:
         """
         If the origin masks is not None, then the sparsity in new generated config_list need to be rescaled.
+        Return a new config list, `config_list` will not be modified.
         """
+        new_config_list = []
         for config in config_list:
             assert len(config['op_names']) == 1
             op_name = config['op_names'][0]
+            sparsity = config['total_sparsity']
             if op_name in self.masked_rate:
-                config['total_sparsity'] = self.masked_rate[op_name] + config['total_sparsity'] * (1 - self.masked_rate[op_name])
-        return config_list
+                sparsity = self.masked_rate[op_name] + sparsity * (1 - self.masked_rate[op_name])
+            new_config_list.append({'total_sparsity': sparsity, 'op_names': [op_name]})
+        return new_config_list
 
     def init_pending_tasks(self) -> List[Task]:
-        origin_model = torch.load(self._origin_model_path)
-        origin_masks = torch.load(self._origin_masks_path)
+        origin_model = self._get_origin_model()
+        origin_masks = self._get_origin_masks()
 
-        self.temp_model_path = Path(self._intermidiate_result_dir, 'origin_compact_model.pth')
-        self.temp_masks_path = Path(self._intermidiate_result_dir, 'origin_compact_model_masks.pth')
-        torch.save(origin_model, self.temp_model_path)
-        torch.save(origin_masks, self.temp_masks_path)
+        self.temp_model_path = self._intermidiate_result_dir / 'origin_compact_model.pth'
+        self.temp_masks_path = self._intermidiate_result_dir / 'origin_compact_model_masks.pth'
+        # the origin model and masks have been saved by the base class, reuse the files instead of pickling again
+        _link_or_copy(self._origin_model_path, self.temp_model_path)
+        _link_or_copy(self._origin_masks_path, self.temp_masks_path)
 
         task_result = TaskResult('origin', origin_model, origin_masks, origin_masks, None)
 
@@ -304,25 +363,25 @@ class SimulatedAnnealingTaskGenerator(TaskGenerator):
         else:
             score = self._tasks[task_result.task_id].score
             if self._current_sparsity_list is None:
-                self._current_sparsity_list = deepcopy(self._temp_sparsity_list)
+                self._current_sparsity_list = _clone_sparsity_list(self._temp_sparsity_list)
                 self._current_score = score
             else:
                 delta_E = np.abs(score - self._current_score)
                 probability = np.exp(-1 * delta_E / self.current_temperature)
-                if self._current_score < score or np.random.uniform(0, 1) < probability:
+                if self._current_score < score or self._rng.random() < probability:
                     self._current_score = score
-                    self._current_sparsity_list = deepcopy(self._temp_sparsity_list)
+                    self._current_sparsity_list = _clone_sparsity_list(self._temp_sparsity_list)
                     self.current_temperature *= self.cool_down_rate
             if self.current_temperature < self.stop_temperature:
                 return []
             self._update_with_perturbations()
 
         task_id = self._task_id_candidate
-        new_config_list = self._recover_real_sparsity(deepcopy(self._temp_config_list))
-        config_list_path = Path(self._intermidiate_result_dir, '{}_config_list.json'.format(task_id))
+        new_config_list = self._recover_real_sparsity(self._temp_config_list)
+        config_list_path = self._intermidiate_result_dir / f'{task_id}_config_list.json'
 
-        with Path(config_list_path).open('w') as f:
-            json_tricks.dump(new_config_list, f, indent=4)
+        with config_list_path.open('w') as f:
+            json.dump(new_config_list, f, indent=4)
 
         task = Task(task_id, self.temp_model_path, self.temp_masks_path, config_list_path)
 
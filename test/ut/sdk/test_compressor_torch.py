@@ -2,6 +2,8 @@
 # Licensed under the MIT license.
 
 import copy
+import os
+import tempfile
 from unittest import TestCase, main
 import numpy as np
 import torch
@@ -33,10 +35,54 @@ class TorchModel(torch.nn.Module):
         return F.log_softmax(x, dim=1)
 
 
+def _filter_weights(values, kernel_shape):
+    """
+    Build a conv weight whose i-th filter is filled with ``values[i]``.
+    """
+    values = np.asarray(values, dtype=np.float32)
+    return torch.from_numpy(np.broadcast_to(values.reshape(-1, 1, 1, 1), (len(values), *kernel_shape)).copy())
+
+
+# conv weights and gradients used by the pruner tests, conv1 filters have shape (1, 5, 5), conv2 filters have shape (5, 5, 5)
+_FPGM_W = _filter_weights(np.arange(1, 11), (5, 5, 5))
+_L1_W1 = _filter_weights(np.arange(5), (1, 5, 5))
+_L1_W2 = _filter_weights(np.arange(10), (5, 5, 5))
+_TAYLOR_W1 = _filter_weights(np.arange(5), (1, 5, 5))
+_TAYLOR_W2 = _filter_weights(np.arange(10, 0, -1), (5, 5, 5))
+_TAYLOR_GRAD1 = _filter_weights([-1, 1, -1, 1, -1], (1, 5, 5))
+_TAYLOR_GRAD2 = _filter_weights((-1) ** np.arange(10), (5, 5, 5))
+
+# only used to trace the model structure, the values do not matter
+_DUMMY_INPUT = torch.zeros(1, 1, 28, 28)
+# a deterministic input covering both negative and positive values, used to collect observer statistics
+_CACHED_INPUT = torch.linspace(-1, 1, 28 * 28).view(1, 1, 28, 28)
+
+# torch.inference_mode only exists from torch 1.9, fall back to no_grad on older versions
+_no_grad = getattr(torch, 'inference_mode', torch.no_grad)
+
+
 class CompressorTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # initialize the model weights once, each test works on its own deep copy
+        torch.manual_seed(0)
+        cls._pristine = TorchModel()
+
+    def setUp(self):
+        torch.manual_seed(0)
+        # exported models and calibration configs are written here instead of the working directory
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self.model_path = os.path.join(self._temp_dir.name, 'test_model.pth')
+        self.calibration_path = os.path.join(self._temp_dir.name, 'test_calibration.pth')
+        self.onnx_path = os.path.join(self._temp_dir.name, 'test_model.onnx')
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    @_no_grad()
     def test_torch_quantizer_modules_detection(self):
         # test if modules can be detected
-        model = TorchModel()
+        model = copy.deepcopy(self._pristine)
         config_list = [{
             'quant_types': ['weight'],
             'quant_bits': 8,
@@ -61,13 +107,15 @@ class CompressorTestCase(TestCase):
         assert "relu" in modules_to_compress_name
         assert len(modules_to_compress_name) == 5
 
+    @_no_grad()
     def test_torch_level_pruner(self):
-        model = TorchModel()
+        model = copy.deepcopy(self._pristine)
         configure_list = [{'sparsity': 0.8, 'op_types': ['default']}]
         torch_pruner.LevelPruner(model, configure_list).compress()
 
+    @_no_grad()
     def test_torch_naive_quantizer(self):
-        model = TorchModel()
+        model = copy.deepcopy(self._pristine)
         configure_list = [{
             'quant_types': ['weight'],
             'quant_bits': {
@@ -77,36 +125,36 @@ class CompressorTestCase(TestCase):
         }]
         torch_quantizer.NaiveQuantizer(model, configure_list).compress()
 
+    @_no_grad()
     def test_torch_fpgm_pruner(self):
         """
-        With filters(kernels) weights defined as above (w), it is obvious that w[4] and w[5] is the Geometric Median
+        With filters(kernels) weights defined as `_FPGM_W`, it is obvious that w[4] and w[5] is the Geometric Median
         which minimize the total geometric distance by defination of Geometric Median in this paper:
         Filter Pruning via Geometric Median for Deep Convolutional Neural Networks Acceleration,
         https://arxiv.org/pdf/1811.00250.pdf
 
         So if sparsity is 0.2, the expected masks should mask out w[4] and w[5], this can be verified through:
-        `all(torch.sum(masks, (1, 2, 3)).numpy() == np.array([125., 125., 125., 125., 0., 0., 125., 125., 125., 125.]))`
+        `torch.equal(torch.sum(masks, (1, 2, 3)), torch.tensor([125., 125., 125., 125., 0., 0., 125., 125., 125., 125.]))`
 
         If sparsity is 0.6, the expected masks should mask out w[2] - w[7], this can be verified through:
-        `all(torch.sum(masks, (1, 2, 3)).numpy() == np.array([125., 125., 0., 0., 0., 0., 0., 0., 125., 125.]))`
+        `torch.equal(torch.sum(masks, (1, 2, 3)), torch.tensor([125., 125., 0., 0., 0., 0., 0., 0., 125., 125.]))`
         """
-        w = np.array([np.ones((5, 5, 5)) * (i+1) for i in range(10)]).astype(np.float32)
-
-        model = TorchModel()
+        model = copy.deepcopy(self._pristine)
         config_list = [{'sparsity': 0.6, 'op_types': ['Conv2d']}, {'sparsity': 0.2, 'op_types': ['Conv2d']}]
         pruner = torch_pruner.FPGMPruner(model, config_list)
 
-        model.conv2.module.weight.data = torch.tensor(w).float()
+        model.conv2.module.weight.data.copy_(_FPGM_W)
         masks = pruner.calc_mask(model.conv2)
-        assert all(torch.sum(masks['weight_mask'], (1, 2, 3)).numpy() == np.array([125., 125., 125., 125., 0., 0., 125., 125., 125., 125.]))
+        assert torch.equal(torch.sum(masks['weight_mask'], (1, 2, 3)), torch.tensor([125., 125., 125., 125., 0., 0., 125., 125., 125., 125.]))
 
-        model.conv2.module.weight.data = torch.tensor(w).float()
+        model.conv2.module.weight.data.copy_(_FPGM_W)
         model.conv2.if_calculated = False
         model.conv2.config = config_list[0]
         masks = pruner.calc_mask(model.conv2)
-        assert all(torch.sum(masks['weight_mask'], (1, 2, 3)).numpy() == np.array([125., 125., 0., 0., 0., 0., 0., 0., 125., 125.]))
+        assert torch.equal(torch.sum(masks['weight_mask'], (1, 2, 3)), torch.tensor([125., 125., 0., 0., 0., 0., 0., 0., 125., 125.]))
 
        
+    @_no_grad()
     def test_torch_l1filter_pruner(self):
         """
         Filters with the minimum sum of the weights' L1 norm are pruned in this paper:
@@ -114,26 +162,24 @@ class CompressorTestCase(TestCase):
         https://arxiv.org/abs/1608.08710
 
         So if sparsity is 0.2 for conv1, the expected masks should mask out filter 0, this can be verified through:
-        `all(torch.sum(mask1, (1, 2, 3)).numpy() == np.array([0., 25., 25., 25., 25.]))`
+        `torch.equal(torch.sum(mask1, (1, 2, 3)), torch.tensor([0., 25., 25., 25., 25.]))`
 
         If sparsity is 0.6 for conv2, the expected masks should mask out filter 0,1,2, this can be verified through:
-        `all(torch.sum(mask2, (1, 2, 3)).numpy() == np.array([0., 0., 0., 0., 0., 0., 125., 125., 125., 125.]))`
+        `torch.equal(torch.sum(mask2, (1, 2, 3)), torch.tensor([0., 0., 0., 0., 0., 0., 125., 125., 125., 125.]))`
         """
-        w1 = np.array([np.ones((1, 5, 5))*i for i in range(5)]).astype(np.float32)
-        w2 = np.array([np.ones((5, 5, 5))*i for i in range(10)]).astype(np.float32)
-
-        model = TorchModel()
+        model = copy.deepcopy(self._pristine)
         config_list = [{'sparsity': 0.2, 'op_types': ['Conv2d'], 'op_names': ['conv1']},
                        {'sparsity': 0.6, 'op_types': ['Conv2d'], 'op_names': ['conv2']}]
         pruner = torch_pruner.L1FilterPruner(model, config_list)
 
-        model.conv1.module.weight.data = torch.tensor(w1).float()
-        model.conv2.module.weight.data = torch.tensor(w2).float()
+        model.conv1.module.weight.data.copy_(_L1_W1)
+        model.conv2.module.weight.data.copy_(_L1_W2)
         mask1 = pruner.calc_mask(model.conv1)
         mask2 = pruner.calc_mask(model.conv2)
-        assert all(torch.sum(mask1['weight_mask'], (1, 2, 3)).numpy() == np.array([0., 25., 25., 25., 25.]))
-        assert all(torch.sum(mask2['weight_mask'], (1, 2, 3)).numpy() == np.array([0., 0., 0., 0., 0., 0., 125., 125., 125., 125.]))
+        assert torch.equal(torch.sum(mask1['weight_mask'], (1, 2, 3)), torch.tensor([0., 25., 25., 25., 25.]))
+        assert torch.equal(torch.sum(mask2['weight_mask'], (1, 2, 3)), torch.tensor([0., 0., 0., 0., 0., 0., 125., 125., 125., 125.]))
 
+    @_no_grad()
     def test_torch_slim_pruner(self):
         """
         Scale factors with minimum l1 norm in the BN layers are pruned in this paper:
@@ -141,15 +187,15 @@ class CompressorTestCase(TestCase):
         https://arxiv.org/pdf/1708.06519.pdf
 
         So if sparsity is 0.2, the expected masks should mask out channel 0, this can be verified through:
-        `all(mask1.numpy() == np.array([0., 1., 1., 1., 1.]))`
-        `all(mask2.numpy() == np.array([0., 1., 1., 1., 1.]))`
+        `torch.equal(mask1, torch.tensor([0., 1., 1., 1., 1.]))`
+        `torch.equal(mask2, torch.tensor([0., 1., 1., 1., 1.]))`
 
         If sparsity is 0.6, the expected masks should mask out channel 0,1,2, this can be verified through:
-        `all(mask1.numpy() == np.array([0., 0., 0., 1., 1.]))`
-        `all(mask2.numpy() == np.array([0., 0., 0., 1., 1.]))`
+        `torch.equal(mask1, torch.tensor([0., 0., 0., 1., 1.]))`
+        `torch.equal(mask2, torch.tensor([0., 0., 0., 1., 1.]))`
         """
         w = np.array([0, 1, 2, 3, 4])
-        model = TorchModel()
+        model = copy.deepcopy(self._pristine)
         config_list = [{'sparsity': 0.2, 'op_types': ['BatchNorm2d']}]
         model.bn1.weight.data = torch.tensor(w).float()
         model.bn2.weight.data = torch.tensor(-w).float()
@@ -157,12 +203,12 @@ class CompressorTestCase(TestCase):
 
         mask1 = pruner.calc_mask(model.bn1)
         mask2 = pruner.calc_mask(model.bn2)
-        assert all(mask1['weight_mask'].numpy() == np.array([0., 1., 1., 1., 1.]))
-        assert all(mask2['weight_mask'].numpy() == np.array([0., 1., 1., 1., 1.]))
-        assert all(mask1['bias_mask'].numpy() == np.array([0., 1., 1., 1., 1.]))
-        assert all(mask2['bias_mask'].numpy() == np.array([0., 1., 1., 1., 1.]))
+        assert torch.equal(mask1['weight_mask'], torch.tensor([0., 1., 1., 1., 1.]))
+        assert torch.equal(mask2['weight_mask'], torch.tensor([0., 1., 1., 1., 1.]))
+        assert torch.equal(mask1['bias_mask'], torch.tensor([0., 1., 1., 1., 1.]))
+        assert torch.equal(mask2['bias_mask'], torch.tensor([0., 1., 1., 1., 1.]))
 
-        model = TorchModel()
+        model = copy.deepcopy(self._pristine)
         config_list = [{'sparsity': 0.6, 'op_types': ['BatchNorm2d']}]
         model.bn1.weight.data = torch.tensor(w).float()
         model.bn2.weight.data = torch.tensor(w).float()
@@ -170,10 +216,10 @@ class CompressorTestCase(TestCase):
 
         mask1 = pruner.calc_mask(model.bn1)
         mask2 = pruner.calc_mask(model.bn2)
-        assert all(mask1['weight_mask'].numpy() == np.array([0., 0., 0., 1., 1.]))
-        assert all(mask2['weight_mask'].numpy() == np.array([0., 0., 0., 1., 1.]))
-        assert all(mask1['bias_mask'].numpy() == np.array([0., 0., 0., 1., 1.]))
-        assert all(mask2['bias_mask'].numpy() == np.array([0., 0., 0., 1., 1.]))
+        assert torch.equal(mask1['weight_mask'], torch.tensor([0., 0., 0., 1., 1.]))
+        assert torch.equal(mask2['weight_mask'], torch.tensor([0., 0., 0., 1., 1.]))
+        assert torch.equal(mask1['bias_mask'], torch.tensor([0., 0., 0., 1., 1.]))
+        assert torch.equal(mask2['bias_mask'], torch.tensor([0., 0., 0., 1., 1.]))
 
     def test_torch_taylorFOweight_pruner(self):
         """
@@ -183,43 +229,34 @@ class CompressorTestCase(TestCase):
         http://jankautz.com/publications/Importance4NNPruning_CVPR19.pdf
 
         So if sparsity of conv1 is 0.2, the expected masks should mask out filter 0, this can be verified through:
-        `all(torch.sum(mask1['weight_mask'], (1, 2, 3)).numpy() == np.array([0., 25., 25., 25., 25.]))`
+        `torch.equal(torch.sum(mask1['weight_mask'], (1, 2, 3)), torch.tensor([0., 25., 25., 25., 25.]))`
 
         If sparsity of conv2 is 0.6, the expected masks should mask out filter 4,5,6,7,8,9 this can be verified through:
-        `all(torch.sum(mask2['weight_mask'], (1, 2, 3)).numpy() == np.array([125., 125., 125., 125., 0., 0., 0., 0., 0., 0., ]))`
+        `torch.equal(torch.sum(mask2['weight_mask'], (1, 2, 3)), torch.tensor([125., 125., 125., 125., 0., 0., 0., 0., 0., 0., ]))`
         """
 
-        w1 = np.array([np.zeros((1, 5, 5)), np.ones((1, 5, 5)), np.ones((1, 5, 5)) * 2,
-                      np.ones((1, 5, 5)) * 3, np.ones((1, 5, 5)) * 4])
-        w2 = np.array([[[[i + 1] * 5] * 5] * 5 for i in range(10)[::-1]])
-
-        grad1 = np.array([np.ones((1, 5, 5)) * -1, np.ones((1, 5, 5)) * 1, np.ones((1, 5, 5)) * -1,
-                      np.ones((1, 5, 5)) * 1, np.ones((1, 5, 5)) * -1])
-
-        grad2 = np.array([[[[(-1)**i] * 5] * 5] * 5 for i in range(10)])
-
         config_list = [{'sparsity': 0.2, 'op_types': ['Conv2d'], 'op_names': ['conv1']},
                        {'sparsity': 0.6, 'op_types': ['Conv2d'], 'op_names': ['conv2']}]
 
-        model = TorchModel()
+        model = copy.deepcopy(self._pristine)
         optimizer = torch.optim.SGD(model.parameters(), lr=0.01, momentum=0.5)
         pruner = torch_pruner.TaylorFOWeightFilterPruner(model, config_list, optimizer, trainer=None, criterion=None, sparsifying_training_batches=1)
 
         x = torch.rand((1, 1, 28, 28), requires_grad=True)
-        model.conv1.module.weight.data = torch.tensor(w1).float()
-        model.conv2.module.weight.data = torch.tensor(w2).float()
+        model.conv1.module.weight.data.copy_(_TAYLOR_W1)
+        model.conv2.module.weight.data.copy_(_TAYLOR_W2)
 
         y = model(x)
         y.backward(torch.ones_like(y))
 
-        model.conv1.module.weight.grad.data = torch.tensor(grad1).float()
-        model.conv2.module.weight.grad.data = torch.tensor(grad2).float()
+        model.conv1.module.weight.grad.data.copy_(_TAYLOR_GRAD1)
+        model.conv2.module.weight.grad.data.copy_(_TAYLOR_GRAD2)
         optimizer.step()
 
         mask1 = pruner.calc_mask(model.conv1)
         mask2 = pruner.calc_mask(model.conv2)
-        assert all(torch.sum(mask1['weight_mask'], (1, 2, 3)).numpy() == np.array([0., 25., 25., 25., 25.]))
-        assert all(torch.sum(mask2['weight_mask'], (1, 2, 3)).numpy() == np.array([125., 125., 125., 125., 0., 0., 0., 0., 0., 0., ]))
+        assert torch.equal(torch.sum(mask1['weight_mask'], (1, 2, 3)), torch.tensor([0., 25., 25., 25., 25.]))
+        assert torch.equal(torch.sum(mask2['weight_mask'], (1, 2, 3)), torch.tensor([125., 125., 125., 125., 0., 0., 0., 0., 0., 0., ]))
 
     def test_torch_taylorFOweight_pruner_global_sort(self):
         """
@@ -228,45 +265,37 @@ class CompressorTestCase(TestCase):
 
         So if sparsity of conv operator is 0.4, the expected masks should mask out filter 0 and filter 1 together, 
         this can be verified through:
-        `all(torch.sum(mask1['weight_mask'], (1, 2, 3)).numpy() == np.array([0., 0., 0, 0., 25.]))`
-        `all(torch.sum(mask2['weight_mask'], (1, 2, 3)).numpy() == np.array([125., 125., 125., 125., 125., 125., 125., 0., 0., 0.]))`
+        `torch.equal(torch.sum(mask1['weight_mask'], (1, 2, 3)), torch.tensor([0., 0., 0, 0., 25.]))`
+        `torch.equal(torch.sum(mask2['weight_mask'], (1, 2, 3)), torch.tensor([125., 125., 125., 125., 125., 125., 125., 0., 0., 0.]))`
         """
 
-        w1 = np.array([np.zeros((1, 5, 5)), np.ones((1, 5, 5)), np.ones((1, 5, 5)) * 2,
-                      np.ones((1, 5, 5)) * 3, np.ones((1, 5, 5)) * 4])
-        w2 = np.array([[[[i + 1] * 5] * 5] * 5 for i in range(10)[::-1]])
-
-        grad1 = np.array([np.ones((1, 5, 5)) * -1, np.ones((1, 5, 5)) * 1, np.ones((1, 5, 5)) * -1,
-                      np.ones((1, 5, 5)) * 1, np.ones((1, 5, 5)) * -1])
-
-        grad2 = np.array([[[[(-1)**i] * 5] * 5] * 5 for i in range(10)])
-
         config_list = [{'sparsity': 0.4, 'op_types': ['Conv2d']}]
 
-        model = TorchModel()
+        model = copy.deepcopy(self._pristine)
         optimizer = torch.optim.SGD(model.parameters(), lr=0.01, momentum=0.5)
         pruner = torch_pruner.TaylorFOWeightFilterPruner(model, config_list, optimizer, trainer=None, criterion=None, sparsifying_training_batches=1, global_sort=True)
 
         x = torch.rand((1, 1, 28, 28), requires_grad=True)
-        model.conv1.module.weight.data = torch.tensor(w1).float()
-        model.conv2.module.weight.data = torch.tensor(w2).float()
+        model.conv1.module.weight.data.copy_(_TAYLOR_W1)
+        model.conv2.module.weight.data.copy_(_TAYLOR_W2)
 
         y = model(x)
         y.backward(torch.ones_like(y))
 
-        model.conv1.module.weight.grad.data = torch.tensor(grad1).float()
-        model.conv2.module.weight.grad.data = torch.tensor(grad2).float()
+        model.conv1.module.weight.grad.data.copy_(_TAYLOR_GRAD1)
+        model.conv2.module.weight.grad.data.copy_(_TAYLOR_GRAD2)
         optimizer.step()
 
         mask1 = pruner.calc_mask(model.conv1)
         mask2 = pruner.calc_mask(model.conv2)
         print(torch.sum(mask1['weight_mask'], (1, 2, 3)).numpy())
         print(torch.sum(mask2['weight_mask'], (1, 2, 3)).numpy())
-        assert all(torch.sum(mask1['weight_mask'], (1, 2, 3)).numpy() == np.array([0., 0., 0, 0., 25.]))
-        assert all(torch.sum(mask2['weight_mask'], (1, 2, 3)).numpy() == np.array([125., 125., 125., 125., 125., 125., 125., 0., 0., 0.]))
+        assert torch.equal(torch.sum(mask1['weight_mask'], (1, 2, 3)), torch.tensor([0., 0., 0, 0., 25.]))
+        assert torch.equal(torch.sum(mask2['weight_mask'], (1, 2, 3)), torch.tensor([125., 125., 125., 125., 125., 125., 125., 0., 0., 0.]))
 
+    @_no_grad()
     def test_torch_observer_quantizer(self):
-        model = TorchModel()
+        model = copy.deepcopy(self._pristine)
         # test invalid config
         # only support 8bit for now
         config_list = [{
@@ -278,7 +307,7 @@ class CompressorTestCase(TestCase):
             torch_quantizer.ObserverQuantizer(model, config_list)
 
         # weight will not change for now
-        model = TorchModel().eval()
+        model = copy.deepcopy(self._pristine).eval()
         origin_parameters = copy.deepcopy(dict(model.named_parameters()))
 
         config_list = [{
@@ -287,14 +316,11 @@ class CompressorTestCase(TestCase):
             'op_types': ['Conv2d', 'Linear']
         }]
         quantizer = torch_quantizer.ObserverQuantizer(model, config_list)
-        input = torch.randn(1, 1, 28, 28)
-        model(input)
+        model(_CACHED_INPUT)
         quantizer.compress()
         buffers = dict(model.named_buffers())
         scales = {k: v for k, v in buffers.items() if 'scale' in k}
-        model_path = "test_model.pth"
-        calibration_path = "test_calibration.pth"
-        calibration_config = quantizer.export_model(model_path, calibration_path)
+        calibration_config = quantizer.export_model(self.model_path, self.calibration_path)
         new_parameters = dict(model.named_parameters())
         for layer_name, v in calibration_config.items():
             scale_name = layer_name + '.module.weight_scale'
@@ -305,6 +331,7 @@ class CompressorTestCase(TestCase):
         self.assertTrue(calibration_config is not None)
         self.assertTrue(len(calibration_config) == 4)
 
+    @_no_grad()
     def test_torch_quantizer_weight_type(self):
         quantizer_list = [
             torch_quantizer.QAT_Quantizer,
@@ -312,28 +339,25 @@ class CompressorTestCase(TestCase):
             torch_quantizer.ObserverQuantizer,
             torch_quantizer.NaiveQuantizer,
             torch_quantizer.DoReFaQuantizer]
+        config_list = [{
+            'quant_types': ['weight'],
+            'quant_bits': 8,
+            'op_types': ['Conv2d', 'Linear']
+        }]
         for quantizer_type in quantizer_list:
-            model = TorchModel().eval()
-            config_list = [{
-                'quant_types': ['weight'],
-                'quant_bits': 8,
-                'op_types': ['Conv2d', 'Linear']
-            }]
+            with self.subTest(quantizer=quantizer_type.__name__):
+                model = copy.deepcopy(self._pristine).eval()
+                optimizer = torch.optim.SGD(model.parameters(), lr=0.01, momentum=0.5)
+                if quantizer_type == torch_quantizer.QAT_Quantizer:
+                    quantizer_type(model, config_list, optimizer, dummy_input=_DUMMY_INPUT)
+                else:
+                    quantizer_type(model, config_list, optimizer)
 
-            optimizer = torch.optim.SGD(model.parameters(), lr=0.01, momentum=0.5)
-            dummy = torch.randn(1, 1, 28, 28)
-            if quantizer_type == torch_quantizer.QAT_Quantizer:
-                quantizer_type(model, config_list, optimizer, dummy_input=dummy)
-            else:
-                quantizer_type(model, config_list, optimizer)
-
-            self.assertFalse(isinstance(model.conv1.module.weight, torch.nn.Parameter))
-            self.assertFalse(isinstance(model.conv2.module.weight, torch.nn.Parameter))
-            self.assertFalse(isinstance(model.fc1.module.weight, torch.nn.Parameter))
-            self.assertFalse(isinstance(model.fc2.module.weight, torch.nn.Parameter))
+                self.assertFalse(any(isinstance(getattr(model, name).module.weight, torch.nn.Parameter)
+                                     for name in ('conv1', 'conv2', 'fc1', 'fc2')))
 
     def test_torch_QAT_quantizer(self):
-        model = TorchModel()
+        model = copy.deepcopy(self._pristine)
         config_list = [{
             'quant_types': ['weight', 'input'],
             'quant_bits': 8,
@@ -426,23 +450,22 @@ class CompressorTestCase(TestCase):
         quantize_algorithm_set = [torch_quantizer.QAT_Quantizer, torch_quantizer.DoReFaQuantizer, torch_quantizer.BNNQuantizer]
 
         for config, quantize_algorithm in zip(config_set, quantize_algorithm_set):
-            model = TorchModel()
+            model = copy.deepcopy(self._pristine)
             model.relu = torch.nn.ReLU()
             optimizer = torch.optim.SGD(model.parameters(), lr=0.01, momentum=0.5)
             quantizer = quantize_algorithm(model, config, optimizer)
             quantizer.compress()
 
-            x = torch.rand((1, 1, 28, 28), requires_grad=True)
-            y = model(x)
+            y = model(_CACHED_INPUT)
             y.backward(torch.ones_like(y))
 
-            model_path = "test_model.pth"
-            calibration_path = "test_calibration.pth"
-            onnx_path = "test_model.onnx"
-            input_shape = (1, 1, 28, 28)
-            device = torch.device("cpu")
-
-            calibration_config = quantizer.export_model(model_path, calibration_path, onnx_path, input_shape, device)
+            # exporting onnx is slow, one quantizer is enough to cover it unless NNI_TEST_FULL_ONNX is set
+            if quantize_algorithm is torch_quantizer.QAT_Quantizer or os.environ.get('NNI_TEST_FULL_ONNX'):
+                input_shape = (1, 1, 28, 28)
+                device = torch.device("cpu")
+                calibration_config = quantizer.export_model(self.model_path, self.calibration_path, self.onnx_path, input_shape, device)
+            else:
+                calibration_config = quantizer.export_model(self.model_path, self.calibration_path)
             assert calibration_config is not None
 
     def test_quantizer_load_calibration_config(self):
@@ -458,7 +481,7 @@ class CompressorTestCase(TestCase):
         quantize_algorithm_set = [torch_quantizer.ObserverQuantizer, torch_quantizer.QAT_Quantizer, torch_quantizer.LsqQuantizer]
         calibration_config = None
         for quantize_algorithm in quantize_algorithm_set:
-            model = TorchModel().eval()
+            model = copy.deepcopy(self._pristine).eval()
             model.relu = torch.nn.ReLU()
             optimizer = torch.optim.SGD(model.parameters(), lr=0.01, momentum=0.5)
             quantizer = quantize_algorithm(model, configure_list, optimizer)
@@ -466,14 +489,12 @@ class CompressorTestCase(TestCase):
             if calibration_config is not None:
                 quantizer.load_calibration_config(calibration_config)
 
-            model_path = "test_model.pth"
-            calibration_path = "test_calibration.pth"
-            onnx_path = "test_model.onnx"
             input_shape = (1, 1, 28, 28)
             device = torch.device("cpu")
 
-            calibration_config = quantizer.export_model(model_path, calibration_path, onnx_path, input_shape, device)
+            calibration_config = quantizer.export_model(self.model_path, self.calibration_path, self.onnx_path, input_shape, device)
 
+    @_no_grad()
     def test_torch_pruner_validation(self):
         # test bad configuraiton
         pruner_classes = [torch_pruner.__dict__[x] for x in \
@@ -498,26 +519,17 @@ class CompressorTestCase(TestCase):
                 {'sparsity': 0.6, 'op_names': 'abc'}
             ]
         ]
-        model = TorchModel()
+        model = copy.deepcopy(self._pristine)
         optimizer = torch.optim.SGD(model.parameters(), lr=0.01)
         for pruner_class in pruner_classes:
+            kwargs = {}
+            if pruner_class in (torch_pruner.SlimPruner, torch_pruner.AGPPruner, torch_pruner.ActivationMeanRankFilterPruner, torch_pruner.ActivationAPoZRankFilterPruner):
+                kwargs = {'optimizer': None, 'trainer': None, 'criterion': None}
             for config_list in bad_configs:
-                try:
-                    kwargs = {}
-                    if pruner_class in (torch_pruner.SlimPruner, torch_pruner.AGPPruner, torch_pruner.ActivationMeanRankFilterPruner, torch_pruner.ActivationAPoZRankFilterPruner):
-                        kwargs = {'optimizer': None, 'trainer': None, 'criterion': None}
-
-                    print('kwargs', kwargs)
-                    pruner_class(model, config_list, **kwargs)      
-
-                    print(config_list)
-                    assert False, 'Validation error should be raised for bad configuration'
-                except schema.SchemaError:
-                    pass
-                except:
-                    print('FAILED:', pruner_class, config_list)
-                    raise
+                with self.subTest(pruner=pruner_class.__name__, config_list=config_list), self.assertRaises(schema.SchemaError):
+                    pruner_class(model, config_list, **kwargs)
 
+    @_no_grad()
     def test_torch_quantizer_validation(self):
         # test bad configuraiton
         quantizer_classes = [torch_quantizer.__dict__[x] for x in \
@@ -540,19 +552,12 @@ class CompressorTestCase(TestCase):
                 {'quant_bits': {'abc': 123}}
             ]
         ]
-        model = TorchModel()
+        model = copy.deepcopy(self._pristine)
         optimizer = torch.optim.SGD(model.parameters(), lr=0.01)
         for quantizer_class in quantizer_classes:
             for config_list in bad_configs:
-                try:
+                with self.subTest(quantizer=quantizer_class.__name__, config_list=config_list), self.assertRaises(schema.SchemaError):
                     quantizer_class(model, config_list, optimizer)
-                    print(config_list)
-                    assert False, 'Validation error should be raised for bad configuration'
-                except schema.SchemaError:
-                    pass
-                except:
-                    print('FAILED:', quantizer_class, config_list)
-                    raise
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,97 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+from pathlib import Path
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+if sys.version_info < (3, 8):
+    # the v2 compression package uses typing.Literal, which is only available from python 3.8
+    raise unittest.SkipTest('compression v2 requires python >= 3.8')
+
+from nni.algorithms.compression.v2.pytorch.base import TaskResult
+from nni.algorithms.compression.v2.pytorch.pruning.tools import AGPTaskGenerator, SimulatedAnnealingTaskGenerator
+
+
+class TorchModel(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.conv1 = torch.nn.Conv2d(1, 5, 5, 1)
+        self.conv2 = torch.nn.Conv2d(5, 10, 5, 1)
+        self.fc1 = torch.nn.Linear(4 * 4 * 10, 10)
+
+    def forward(self, x):
+        x = F.max_pool2d(F.relu(self.conv1(x)), 2, 2)
+        x = F.max_pool2d(F.relu(self.conv2(x)), 2, 2)
+        return self.fc1(x.view(-1, 4 * 4 * 10))
+
+
+class TaskGeneratorTestCase(unittest.TestCase):
+    def setUp(self):
+        self._log_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self._log_dir.cleanup()
+
+    def test_in_memory_intermediate_result(self):
+        config_list = [{'op_types': ['Conv2d'], 'total_sparsity': 0.8}]
+        task_generator = AGPTaskGenerator(2, TorchModel(), config_list, log_dir=self._log_dir.name, keep_intermidiate_result=False)
+        origin_model = task_generator._get_origin_model()
+        origin_state_dict = {k: v.clone() for k, v in origin_model.state_dict().items()}
+
+        task = task_generator.next()
+        self.assertIsNone(task.to_dict()['model_path'])
+        self.assertIsNone(task.to_dict()['masks_path'])
+        model, masks, _ = task.load_data()
+        self.assertIsNot(model, origin_model)
+
+        # simulate the pruner modifying the model of this task in place
+        model.conv1.weight.data.zero_()
+        new_masks = {'conv1': {'weight': torch.zeros_like(model.conv1.weight), 'bias': None}}
+        task_generator.receive_task_result(TaskResult(task.task_id, model, new_masks, new_masks, 0.5))
+
+        for name, value in task_generator._get_origin_model().state_dict().items():
+            self.assertTrue(torch.equal(value, origin_state_dict[name]), name)
+
+        task = task_generator.next()
+        self.assertIsNone(task.to_dict()['model_path'])
+        next_model, next_masks, _ = task.load_data()
+        self.assertIs(next_model, model)
+        self.assertIs(next_masks, new_masks)
+
+        self.assertEqual(list(Path(self._log_dir.name).rglob('*_compact_model*.pth')), [])
+
+    def test_kept_intermediate_result(self):
+        config_list = [{'op_types': ['Conv2d'], 'total_sparsity': 0.8}]
+        task_generator = AGPTaskGenerator(2, TorchModel(), config_list, log_dir=self._log_dir.name, keep_intermidiate_result=True)
+
+        task = task_generator.next()
+        self.assertTrue(Path(task.to_dict()['model_path']).exists())
+        self.assertTrue(Path(task.to_dict()['masks_path']).exists())
+        model, _, _ = task.load_data()
+        self.assertIsNot(model, task_generator._get_origin_model())
+
+    def test_simulated_annealing_reproducible(self):
+        def run_config_lists():
+            np.random.seed(0)
+            config_list = [{'op_types': ['Conv2d', 'Linear'], 'total_sparsity': 0.5}]
+            with tempfile.TemporaryDirectory() as log_dir:
+                task_generator = SimulatedAnnealingTaskGenerator(TorchModel(), config_list, log_dir=log_dir)
+                config_lists = []
+                for score in [0., 1., 0.]:
+                    task = task_generator.next()
+                    model, masks, task_config_list = task.load_data()
+                    config_lists.append(task_config_list)
+                    task_generator.receive_task_result(TaskResult(task.task_id, model, masks, masks, score))
+            return config_lists
+
+        self.assertEqual(run_config_lists(), run_config_lists())
+
+
+if __name__ == '__main__':
+    unittest.main()